@@ -1,20 +1,28 @@
 #!/usr/bin/env python3
 """Parse Wikipedia XML dump and chunk into passages.
 
-Resumable: if output file exists, skips already-processed articles.
+Resumable: progress is checkpointed next to the output file, and a rerun
+skips the articles already written.
 Uses multiprocessing to parallelize the CPU-bound wikitext parsing.
+Decompresses the dump in parallel when indexed_bzip2 (or lbzip2) is available.
 
 Outputs JSONL with one passage per line:
   {"id": "...", "title": "...", "text": "...", "chunk_index": 0}
 """
 
 import bz2
+import contextlib
+import html
+import io
+import itertools
 import json
 import multiprocessing as mp
 import os
 import re
+import shutil
+import subprocess
 import sys
-import xml.etree.ElementTree as ET
+import threading
 
 from tqdm import tqdm
 
@@ -24,29 +32,133 @@ except ImportError:
     print("Install mwparserfromhell: pip install mwparserfromhell")
     sys.exit(1)
 
+try:
+    from lxml import etree as ET
+
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+    HAVE_LXML = False
+
+try:
+    import orjson
+
+    _dumps = orjson.dumps
+except ImportError:
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode()
+
+
+try:
+    import indexed_bzip2
+except ImportError:
+    indexed_bzip2 = None  # falls back to lbzip2, then stdlib bz2
+
 INPUT_FILE = "data/simplewiki-latest-pages-articles.xml.bz2"
 OUTPUT_FILE = "data/passages.jsonl"
+CHECKPOINT_FILE = OUTPUT_FILE + ".offset"
+CHECKPOINT_EVERY = 1024  # articles between progress checkpoints
 MIN_WORDS = 30
 MAX_WORDS = 300
-BATCH_SIZE = 128  # articles per multiprocessing batch
+MIN_WIKITEXT_CHARS = MIN_WORDS * 6  # approximate cutoff: ~5 chars per word plus a space
+POOL_CHUNKSIZE = 64  # articles per task sent to a worker
+IN_FLIGHT_PER_WORKER = 4 * POOL_CHUNKSIZE  # caps articles buffered ahead of the pool
+READ_BUFFER_SIZE = 256 * 1024  # decompressed bytes buffered ahead of the XML parser
+WRITE_BUFFER_SIZE = 4 * 1024 * 1024  # output file buffer
+WRITE_BATCH_CHUNKS = 1024  # serialized chunks collected before each write call
 
 # Simple English Wikipedia: ~250K articles total, ~200K in main namespace
 ESTIMATED_ARTICLES = 200_000
 
 # MediaWiki XML namespace
 MW_NS = "http://www.mediawiki.org/xml/export-0.11/"
-
-
-def clean_wikitext(wikitext: str) -> str:
-    """Convert wikitext to plain text using mwparserfromhell."""
+PAGE_TAG = f"{{{MW_NS}}}page"
+
+# Redirect magic words (English plus common localized forms), compared casefolded
+REDIRECT_PREFIXES = ("#redirect", "#weiterleitung", "#redirection", "#redirección", "#rinvia")
+
+_RE_NL3 = re.compile(r"\n{3,}")
+_RE_SP2 = re.compile(r" {2,}")
+_RE_SENT = re.compile(r"(?<=[.!?])\s+")
+# Whole template name only: {{Disambiguation needed}} and similar inline
+# tags appear in ordinary articles
+_RE_DISAMBIG = re.compile(r"\{\{\s*(?:disambig(?:uation)?|dab)\s*(?:\||\}\})|__DISAMBIG__", re.I)
+
+# Wikitext stripping, applied in order by _strip_wikitext
+_RE_COMMENT = re.compile(r"<!--.*?-->", re.S)
+_RE_HIDDEN_TAG = re.compile(
+    r"<(ref|math|gallery|timeline|imagemap|score|graph|source|syntaxhighlight|pre)\b"
+    r"[^>]*?(?:/>|>.*?</\1\s*>)",
+    re.S | re.I,
+)
+_RE_TEMPLATE = re.compile(r"\{\{[^{}]*\}\}")  # innermost only; applied until fixpoint
+_RE_TABLE = re.compile(r"\{\|(?:(?!\{\|).)*?\|\}", re.S)  # innermost only
+_RE_FILE_LINK = re.compile(
+    r"\[\[(?i:file|image|media|category):[^\[\]]*(?:\[\[[^\[\]]*\]\][^\[\]]*)*\]\]"
+)
+_RE_LINK = re.compile(r"\[\[(?:[^\[\]|]*\|)?([^\[\]]*)\]\]")
+_RE_EXT_LINK = re.compile(r"\[(?:https?:)?//[^\s\]]*\s*([^\]]*)\]")
+_RE_QUOTES = re.compile(r"'{2,}")
+_RE_TAG = re.compile(r"</?[a-zA-Z][^>]*>")
+_RE_HEADING = re.compile(r"^=+\s*(.*?)\s*=+\s*$", re.M)
+_RE_LIST = re.compile(r"^[*#:;]+\s*", re.M)
+_RE_MAGIC = re.compile(r"__[A-Z]+__")
+
+
+def _sub_until_fixpoint(pattern: re.Pattern, text: str) -> str:
+    """Repeatedly remove innermost matches so nested constructs unwind."""
+    n = 1
+    while n:
+        text, n = pattern.subn("", text)
+    return text
+
+
+def _strip_wikitext(wikitext: str) -> str:
+    """Strip wikitext markup with regexes. Much cheaper than building a parse tree."""
+    text = _RE_COMMENT.sub("", wikitext)
+    text = _RE_HIDDEN_TAG.sub("", text)
+    text = _sub_until_fixpoint(_RE_TEMPLATE, text)
+    text = _sub_until_fixpoint(_RE_TABLE, text)
+    text = _RE_FILE_LINK.sub("", text)
+    text = _RE_LINK.sub(r"\1", text)
+    text = _RE_EXT_LINK.sub(r"\1", text)
+    text = _RE_QUOTES.sub("", text)
+    text = _RE_TAG.sub("", text)
+    text = _RE_HEADING.sub(r"\1", text)
+    text = _RE_LIST.sub("", text)
+    text = _RE_MAGIC.sub("", text)
+    return html.unescape(text)
+
+
+def _strip_wikitext_mwparser(wikitext: str) -> str:
+    """Strip wikitext with a full mwparserfromhell parse.
+
+    strip_code drops templates and comments entirely, so they are removed by
+    regex first instead of being tokenized (they are much of a page's markup).
+    """
+    text = _sub_until_fixpoint(_RE_TEMPLATE, _RE_COMMENT.sub("", wikitext))
     try:
-        parsed = mwparserfromhell.parse(wikitext)
-        text = parsed.strip_code(normalize=True, collapse=True)
-        text = re.sub(r"\n{3,}", "\n\n", text)
-        text = re.sub(r" {2,}", " ", text)
-        return text.strip()
+        text = mwparserfromhell.parse(text).strip_code(normalize=True, collapse=True)
     except Exception:
         return ""
+    # Bold/italic wrapped around a removed template is left unpaired
+    return _RE_QUOTES.sub("", text)
+
+
+def clean_wikitext(wikitext: str) -> str:
+    """Convert wikitext to plain text.
+
+    Uses the regex stripper, falling back to mwparserfromhell when the regexes
+    removed over 90% of the input (usually malformed or unusual markup).
+    """
+    text = _strip_wikitext(wikitext)
+    if len(text) < len(wikitext) // 10:
+        text = _strip_wikitext_mwparser(wikitext)
+    text = _RE_NL3.sub("\n\n", text)
+    text = _RE_SP2.sub(" ", text)
+    return text.strip()
 
 
 def chunk_text(text: str, title: str) -> list[dict]:
@@ -56,14 +168,15 @@ def chunk_text(text: str, title: str) -> list[dict]:
     current_chunk = []
     current_words = 0
 
+    # Word counts via str.count: clean_wikitext already collapsed runs of spaces,
+    # so this avoids allocating a list of words per paragraph and sentence.
     for para in paragraphs:
-        words = para.split()
-        para_words = len(words)
+        para_words = para.count(" ") + para.count("\n") + 1
 
         if para_words > MAX_WORDS:
-            sentences = re.split(r"(?<=[.!?])\s+", para)
+            sentences = _RE_SENT.split(para)
             for sentence in sentences:
-                s_words = len(sentence.split())
+                s_words = sentence.count(" ") + sentence.count("\n") + 1
                 if current_words + s_words > MAX_WORDS and current_words >= MIN_WORDS:
                     chunks.append(
                         {
@@ -99,8 +212,9 @@ def chunk_text(text: str, title: str) -> list[dict]:
             }
         )
 
+    safe_title = title.replace(" ", "_")
     for i, chunk in enumerate(chunks):
-        chunk["id"] = f"{title.replace(' ', '_')}_{i}"
+        chunk["id"] = f"{safe_title}_{i}"
 
     return chunks
 
@@ -114,50 +228,109 @@ def process_article(args: tuple[str, str]) -> list[dict]:
     return chunk_text(text, title)
 
 
+@contextlib.contextmanager
+def open_dump(filepath: str):
+    """Open a bz2 dump as a decompressed binary stream.
+
+    Decompression dominates the read side, so prefer a parallel block decoder:
+    indexed_bzip2 if installed, else an `lbzip2 -dc` subprocess, else stdlib bz2.
+    """
+    if indexed_bzip2 is not None:
+        with indexed_bzip2.open(filepath, parallelization=os.cpu_count()) as f:
+            yield f
+        return
+
+    lbzip2 = shutil.which("lbzip2")
+    if lbzip2:
+        proc = subprocess.Popen(
+            [lbzip2, "-dc", filepath], stdout=subprocess.PIPE, bufsize=READ_BUFFER_SIZE
+        )
+        try:
+            yield proc.stdout
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        return
+
+    with bz2.BZ2File(filepath, "rb") as raw:
+        yield io.BufferedReader(raw, buffer_size=READ_BUFFER_SIZE)
+
+
+def iter_pages(f):
+    """Yield each <page> element as it completes, freeing it once the caller moves on.
+
+    iterparse builds elements in C. A pure-Python expat (SAX) handler avoids the
+    tree but pays a Python call per start/end/data event, which measured ~1.6x
+    slower than lxml and slower than stdlib iterparse on real dump pages.
+    """
+    if HAVE_LXML:
+        # libxml2 filters on the tag, so only </page> events reach Python
+        for _, elem in ET.iterparse(f, events=("end",), tag=PAGE_TAG, huge_tree=True):
+            yield elem
+            elem.clear(keep_tail=False)
+            # Drop already-processed siblings so the root doesn't grow
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    else:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == PAGE_TAG:
+                yield elem
+                elem.clear()
+
+
 def iter_articles(filepath: str):
     """Iterate over articles in a Wikipedia XML dump (bz2 compressed)."""
-    with bz2.open(filepath, "rt", encoding="utf-8") as f:
-        context = ET.iterparse(f, events=("end",))
-        for event, elem in context:
-            tag = elem.tag.replace(f"{{{MW_NS}}}", "")
-
-            if tag == "page":
-                ns_elem = elem.find(f"{{{MW_NS}}}ns")
-                if ns_elem is not None and ns_elem.text == "0":
-                    title_elem = elem.find(f"{{{MW_NS}}}title")
-                    text_elem = elem.find(
-                        f".//{{{MW_NS}}}revision/{{{MW_NS}}}text"
-                    )
+    with open_dump(filepath) as f:
+        for page in iter_pages(f):
+            ns_elem = page.find(f"{{{MW_NS}}}ns")
+            if ns_elem is None or ns_elem.text != "0":
+                continue
 
-                    if title_elem is not None and text_elem is not None and text_elem.text:
-                        title = title_elem.text
-                        wikitext = text_elem.text
+            title_elem = page.find(f"{{{MW_NS}}}title")
+            text_elem = page.find(f".//{{{MW_NS}}}revision/{{{MW_NS}}}text")
 
-                        if wikitext.lower().startswith("#redirect"):
-                            elem.clear()
-                            continue
+            if title_elem is not None and text_elem is not None and text_elem.text:
+                title = title_elem.text
+                wikitext = text_elem.text
 
-                        yield title, wikitext
+                # Cheap checks that keep redirects, disambiguation pages and
+                # stubs out of the pool. The length cutoff is approximate: a
+                # page of 30 very short words can fall under it and be skipped
+                if len(wikitext) < MIN_WIKITEXT_CHARS:
+                    continue
+                if wikitext[:32].lstrip().casefold().startswith(REDIRECT_PREFIXES):
+                    continue
+                if _RE_DISAMBIG.search(wikitext):
+                    continue
 
-                elem.clear()
+                yield title, wikitext
+
+
+def iter_bounded(articles, slots: threading.Semaphore):
+    """Yield articles, blocking while the pool already holds too many unprocessed ones."""
+    for article in articles:
+        slots.acquire()
+        yield article
 
 
-def load_processed_titles(filepath: str) -> tuple[set[str], int]:
-    """Load titles already in the output file for resumability. Returns (titles, chunk_count)."""
-    titles = set()
-    chunks = 0
+def load_checkpoint(filepath: str) -> tuple[int, int, int]:
+    """Load progress for resumability. Returns (articles_done, output_bytes, chunk_count)."""
     if not os.path.exists(filepath):
-        return titles, chunks
-    with open(filepath) as f:
-        for line in f:
-            if line.strip():
-                try:
-                    data = json.loads(line)
-                    titles.add(data["title"])
-                    chunks += 1
-                except (json.JSONDecodeError, KeyError):
-                    continue
-    return titles, chunks
+        return 0, 0, 0
+    try:
+        with open(filepath) as f:
+            data = json.load(f)
+        return data["articles"], data["bytes"], data["chunks"]
+    except (json.JSONDecodeError, KeyError):
+        return 0, 0, 0
+
+
+def save_checkpoint(filepath: str, articles: int, output_bytes: int, chunks: int):
+    """Record progress atomically, so a crash never leaves a torn checkpoint."""
+    tmp = filepath + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"articles": articles, "bytes": output_bytes, "chunks": chunks}, f)
+    os.replace(tmp, filepath)
 
 
 def main():
@@ -169,14 +342,22 @@ def main():
     os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
 
     # Check for existing progress
-    processed_titles, existing_chunks = load_processed_titles(OUTPUT_FILE)
-    skip_count = len(processed_titles)
+    skip_count, output_bytes, existing_chunks = load_checkpoint(CHECKPOINT_FILE)
 
-    if skip_count > 0:
+    if skip_count > 0 and os.path.exists(OUTPUT_FILE):
         print(f"Resuming: {skip_count} articles ({existing_chunks} chunks) already processed")
-        mode = "a"
+        # Anything written after the last checkpoint is redone, so drop it
+        with open(OUTPUT_FILE, "r+b") as f:
+            f.truncate(output_bytes)
+        mode = "ab"
     else:
-        mode = "w"
+        skip_count = existing_chunks = 0
+        mode = "wb"
+
+    if not (mwparserfromhell.parser.use_c and mwparserfromhell.parser.CTokenizer):
+        # Only the fallback path uses mwparserfromhell, but its pure-Python tokenizer is ~2x slower
+        print("Warning: mwparserfromhell C tokenizer unavailable; fallback parsing will be slow.")
+        print("Fix: pip install --force-reinstall mwparserfromhell\n")
 
     n_workers = max(1, mp.cpu_count() - 1)
     print(f"Input:  {INPUT_FILE}")
@@ -187,37 +368,53 @@ def main():
 
     pbar = tqdm(
         total=ESTIMATED_ARTICLES,
+        initial=skip_count,
         desc="Chunking",
         unit=" articles",
         dynamic_ncols=True,
     )
 
-    with open(OUTPUT_FILE, mode) as out, mp.Pool(n_workers) as pool:
-        batch = []
-
-        for title, wikitext in iter_articles(INPUT_FILE):
-            pbar.update(1)
-
-            if title in processed_titles:
-                continue
-
-            batch.append((title, wikitext))
-
-            if len(batch) >= BATCH_SIZE:
-                # Process batch in parallel
-                for chunks in pool.imap_unordered(process_article, batch):
-                    for chunk in chunks:
-                        out.write(json.dumps(chunk) + "\n")
-                        total_chunks += 1
+    # The pool's task thread pulls articles from the dump while workers parse;
+    # the semaphore keeps it from buffering the whole dump in memory.
+    max_in_flight = n_workers * IN_FLIGHT_PER_WORKER
+    slots = threading.Semaphore(max_in_flight)
+    # Results come back in dump order, so finished articles are always a prefix
+    # of the dump and resuming is a matter of skipping that many.
+    articles = itertools.islice(iter_articles(INPUT_FILE), skip_count, None)
+    done = skip_count
+
+    with open(OUTPUT_FILE, mode, buffering=WRITE_BUFFER_SIZE) as out, mp.Pool(n_workers) as pool:
+        pending = bytearray()
+        pending_chunks = 0
+        try:
+            for chunks in pool.imap(
+                process_article, iter_bounded(articles, slots), chunksize=POOL_CHUNKSIZE
+            ):
+                slots.release()
+                pbar.update(1)
+                for chunk in chunks:
+                    pending += _dumps(chunk)
+                    pending += b"\n"
+                pending_chunks += len(chunks)
+                total_chunks += len(chunks)
                 pbar.set_postfix(chunks=f"{total_chunks:,}", refresh=False)
-                batch = []
 
-        # Process remaining articles
-        if batch:
-            for chunks in pool.imap_unordered(process_article, batch):
-                for chunk in chunks:
-                    out.write(json.dumps(chunk) + "\n")
-                    total_chunks += 1
+                done += 1
+                checkpoint = done % CHECKPOINT_EVERY == 0
+                if checkpoint or pending_chunks >= WRITE_BATCH_CHUNKS:
+                    out.write(pending)
+                    pending.clear()
+                    pending_chunks = 0
+                if checkpoint:
+                    out.flush()
+                    save_checkpoint(CHECKPOINT_FILE, done, out.tell(), total_chunks)
+
+            out.write(pending)
+            out.flush()
+            save_checkpoint(CHECKPOINT_FILE, done, out.tell(), total_chunks)
+        finally:
+            # Unblock the task thread so the pool can shut down on error
+            slots.release(max_in_flight)
 
     pbar.close()
     print(f"\nTotal chunks: {total_chunks:,}")
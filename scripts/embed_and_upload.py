@@ -5,30 +5,44 @@ Supports two modes:
   --cloud-inference  : Send text to Qdrant Cloud, which embeds server-side (fast, no local GPU needed)
   (default)          : Embed locally with sentence-transformers, then upload vectors
 
-Resumable: checks how many points are already in Qdrant and skips them.
+Resumable: journals the byte offset of the last fully uploaded passage and seeks past it.
 Streams passages from JSONL — does not load all into memory.
 Indexing is disabled during upload and re-enabled after.
 """
 
+import asyncio
+import hashlib
+import itertools
 import json
 import os
 import sys
 import uuid
+from collections import deque
 
+import numpy as np
 from dotenv import load_dotenv
 from tqdm import tqdm
 
 load_dotenv()
 
 try:
-    from qdrant_client import QdrantClient
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+try:
+    from qdrant_client import AsyncQdrantClient, QdrantClient
     from qdrant_client.http.models import Document
     from qdrant_client.models import (
-        BinaryQuantization,
-        BinaryQuantizationConfig,
+        Batch,
+        Datatype,
         Distance,
         OptimizersConfigDiff,
-        PointStruct,
+        ScalarQuantization,
+        ScalarQuantizationConfig,
+        ScalarType,
         VectorParams,
     )
 except ImportError:
@@ -41,8 +55,17 @@ QDRANT_API_KEY = os.environ.get("QDRANT_API_KEY")
 COLLECTION_NAME = os.environ.get("QDRANT_COLLECTION", "wiki_passages")
 MODEL_NAME = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 UPLOAD_BATCH_SIZE = 128  # Qdrant cloud inference batch size
-LOCAL_EMBED_BATCH_SIZE = 256
+CLOUD_UPLOAD_CONCURRENCY = 8  # cloud inference upserts in flight at once
+EMBED_TOKEN_BUDGET = 65536  # padded tokens per local forward pass
+MAX_EMBED_BATCH_SIZE = 1024
+CHARS_PER_TOKEN = 4  # rough English average, for sizing batches before tokenizing
 LOCAL_UPLOAD_BATCH_SIZE = 2048
+MAX_PENDING_UPLOADS = 8  # local upserts in flight before embedding waits for one
+# Upload journal, per collection: byte offset into INPUT_FILE already uploaded
+PROGRESS_FILE = f"{INPUT_FILE}.{COLLECTION_NAME}.offset"
+# Local embeddings as raw FP16 rows in passage order, so a resumed run
+# re-sends windows that were embedded but not yet uploaded without the model
+EMBED_CACHE_FILE = f"{INPUT_FILE}.{COLLECTION_NAME}.f16"
 
 MODEL_DIMS = {
     "all-MiniLM-L6-v2": 384,
@@ -50,19 +73,42 @@ MODEL_DIMS = {
 }
 VECTOR_DIM = MODEL_DIMS.get(MODEL_NAME, 384)
 
+# SHA-1 state after hashing the namespace; copying it skips re-hashing the
+# namespace and concatenating it with each passage ID
+_NAMESPACE_SHA1 = hashlib.sha1(uuid.NAMESPACE_URL.bytes)
+
+
+def point_id(passage_id: str) -> str:
+    """Point ID for a passage: str(uuid.uuid5(NAMESPACE_URL, passage_id)), minus the UUID object."""
+    sha = _NAMESPACE_SHA1.copy()
+    sha.update(passage_id.encode())
+    h = sha.hexdigest()
+    # Stamp version 5 and the RFC 4122 variant bits, as uuid.UUID(version=5) does
+    variant = "89ab"[int(h[16], 16) & 0x3]
+    return f"{h[:8]}-{h[8:12]}-5{h[13:16]}-{variant}{h[17:20]}-{h[20:32]}"
 
-def ensure_collection(client: QdrantClient, cloud_inference: bool) -> int:
-    """Create collection if needed with indexing disabled. Returns current point count."""
+
+def passage_payload(passage: dict) -> dict:
+    """Payload stored alongside each passage's vector."""
+    return {
+        "text": passage["text"],
+        "title": passage["title"],
+        "chunk_index": passage["chunk_index"],
+        "passage_id": passage["id"],
+    }
+
+
+def ensure_collection(client: QdrantClient, cloud_inference: bool) -> bool:
+    """Create collection if needed with indexing disabled. Returns True if it was created."""
     collections = [c.name for c in client.get_collections().collections]
 
     if COLLECTION_NAME in collections:
-        info = client.get_collection(COLLECTION_NAME)
-        print(f"Collection '{COLLECTION_NAME}' exists ({info.points_count} points)")
+        print(f"Collection '{COLLECTION_NAME}' exists")
         client.update_collection(
             collection_name=COLLECTION_NAME,
             optimizer_config=OptimizersConfigDiff(indexing_threshold=0),
         )
-        return info.points_count
+        return False
 
     if cloud_inference:
         # For cloud inference, Qdrant manages vector config based on the model
@@ -73,157 +119,327 @@ def ensure_collection(client: QdrantClient, cloud_inference: bool) -> int:
                 distance=Distance.COSINE,
             ),
             optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+            # Payloads (mostly passage text) are only read for returned hits,
+            # so they stay on disk rather than in RAM next to the vectors
+            on_disk_payload=True,
         )
     else:
+        # Local embeddings are L2-normalized at encode time, so dot product ranks
+        # exactly like cosine without Qdrant renormalizing every vector, and
+        # FP16 storage halves vector memory and disk.
         client.create_collection(
             collection_name=COLLECTION_NAME,
             vectors_config=VectorParams(
                 size=VECTOR_DIM,
-                distance=Distance.COSINE,
-                quantization_config=BinaryQuantization(
-                    binary=BinaryQuantizationConfig(always_ram=True),
+                distance=Distance.DOT,
+                datatype=Datatype.FLOAT16,
+                # Search runs on the in-RAM int8 codes; the originals are only
+                # read to rescore the top candidates, so they can stay on disk
+                on_disk=True,
+                # int8 keeps ~4x RAM savings; binary codes lose too much recall
+                # on small-dimension models like MiniLM-384
+                quantization_config=ScalarQuantization(
+                    scalar=ScalarQuantizationConfig(
+                        type=ScalarType.INT8,
+                        quantile=0.99,
+                        always_ram=True,
+                    ),
                 ),
             ),
             optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
+            on_disk_payload=True,
         )
     print(f"Created collection '{COLLECTION_NAME}' (dim={VECTOR_DIM}), indexing disabled")
-    return 0
+    return True
 
 
-def count_lines(filepath: str) -> int:
-    """Count lines in a file without loading it all."""
-    count = 0
-    with open(filepath) as f:
+def load_progress(filepath: str) -> tuple[int, int]:
+    """Load the upload journal. Returns (byte offset into INPUT_FILE, passages before it)."""
+    if not os.path.exists(filepath):
+        return 0, 0
+    try:
+        with open(filepath) as f:
+            data = json.load(f)
+        return data["bytes_uploaded"], data["passages_uploaded"]
+    except (json.JSONDecodeError, KeyError):
+        return 0, 0
+
+
+def save_progress(filepath: str, offset: int, passages: int):
+    """Record progress atomically, so a crash never leaves a torn journal."""
+    tmp = filepath + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"bytes_uploaded": offset, "passages_uploaded": passages}, f)
+    os.replace(tmp, filepath)
+
+
+def record_progress(pending: deque, filepath: str):
+    """Journal past uploads that have finished, oldest first.
+
+    pending holds (upload, end offset, passages through it) in file order.
+    Uploads finish out of order, so the journal only advances over the
+    finished prefix: everything before the recorded offset is known to be
+    in Qdrant.
+    """
+    offset = None
+    while pending and pending[0][0].done():
+        upload, offset, passages = pending.popleft()
+        upload.result()  # a failed upload raises here, before it is journaled
+    if offset is not None:
+        save_progress(filepath, offset, passages)
+
+
+def iter_passages(filepath: str, offset: int = 0):
+    """Stream passages from JSONL starting at a byte offset.
+
+    Yields (offset after the passage's line, passage).
+    """
+    with open(filepath, "rb") as f:
+        f.seek(offset)
         for line in f:
-            if line.strip():
-                count += 1
-    return count
+            offset += len(line)
+            # isspace() stops at the first non-blank byte; strip() copies the line
+            if not line.isspace():
+                yield offset, _loads(line)
 
 
-def iter_passages(filepath: str, skip: int = 0):
-    """Stream passages from JSONL, optionally skipping the first `skip` lines."""
-    skipped = 0
-    with open(filepath) as f:
-        for line in f:
-            if not line.strip():
-                continue
-            if skipped < skip:
-                skipped += 1
-                continue
-            yield json.loads(line)
+def upload_cloud_inference(client_kwargs: dict, start_offset: int, start_row: int):
+    """Upload using Qdrant cloud inference — server-side embedding."""
+    asyncio.run(_upload_cloud_inference(client_kwargs, start_offset, start_row))
 
 
-def upload_cloud_inference(client: QdrantClient, total_passages: int, skip_passages: int):
-    """Upload using Qdrant cloud inference — server-side embedding."""
-    remaining = total_passages - skip_passages
+async def _upload_cloud_inference(client_kwargs: dict, start_offset: int, start_row: int):
+    remaining = os.path.getsize(INPUT_FILE) - start_offset
     print(f"\nCloud inference mode (model={MODEL_NAME})")
-    print(f"Upload batch={UPLOAD_BATCH_SIZE}")
-    print(f"Processing {remaining:,} passages...\n")
-
-    pbar = tqdm(total=remaining, desc="Upload", unit=" passages", dynamic_ncols=True)
-    batch: list[PointStruct] = []
-
-    for passage in iter_passages(INPUT_FILE, skip=skip_passages):
-        point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, passage["id"]))
-        batch.append(
-            PointStruct(
-                id=point_id,
-                vector=Document(text=passage["text"], model=MODEL_NAME),
-                payload={
-                    "text": passage["text"],
-                    "title": passage["title"],
-                    "chunk_index": passage["chunk_index"],
-                    "passage_id": passage["id"],
-                },
-            )
-        )
-
-        if len(batch) >= UPLOAD_BATCH_SIZE:
-            client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=False)
-            pbar.update(len(batch))
-            batch = []
+    print(f"Upload batch={UPLOAD_BATCH_SIZE}, concurrency={CLOUD_UPLOAD_CONCURRENCY}")
+    print(f"Processing {remaining:,} bytes of passages...\n")
+
+    pbar = tqdm(total=remaining, desc="Upload", unit="B", unit_scale=True, dynamic_ncols=True)
+    # Server-side embedding makes each upsert slow, so keep several in flight
+    client = AsyncQdrantClient(**client_kwargs)
+    slots = asyncio.Semaphore(CLOUD_UPLOAD_CONCURRENCY)
+    pending: deque[tuple[asyncio.Task, int, int]] = deque()
+
+    async def upsert(batch: Batch, nbytes: int):
+        try:
+            await client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=False)
+        finally:
+            slots.release()
+        pbar.update(nbytes)
+
+    # Column-wise Batch instead of per-point PointStructs: one validation per upsert
+    ids: list[str] = []
+    vectors: list[Document] = []
+    payloads: list[dict] = []
+    batch_start = offset = start_offset
+    row = start_row
+
+    passages = iter_passages(INPUT_FILE, start_offset)
+    for row, (offset, passage) in enumerate(passages, start_row + 1):
+        ids.append(point_id(passage["id"]))
+        vectors.append(Document(text=passage["text"], model=MODEL_NAME))
+        payloads.append(passage_payload(passage))
+
+        if len(ids) >= UPLOAD_BATCH_SIZE:
+            await slots.acquire()  # reading waits while all slots are busy
+            record_progress(pending, PROGRESS_FILE)
+            batch = Batch(ids=ids, vectors=vectors, payloads=payloads)
+            task = asyncio.create_task(upsert(batch, offset - batch_start))
+            pending.append((task, offset, row))
+            await asyncio.sleep(0)  # let the new upsert start sending
+            ids, vectors, payloads = [], [], []
+            batch_start = offset
+
+    await asyncio.gather(*(task for task, _, _ in pending))
+
+    if ids:
+        batch = Batch(ids=ids, vectors=vectors, payloads=payloads)
+        await client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=True)
+        pbar.update(offset - batch_start)
+    save_progress(PROGRESS_FILE, offset, row)
+
+    await client.close()
+    pbar.close()
 
-    if batch:
-        client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=True)
-        pbar.update(len(batch))
 
-    pbar.close()
+def window_batch(window: list[dict], vectors) -> Batch:
+    """Batch for embedded passages (vectors: rows aligned with window)."""
+    return Batch(
+        ids=[point_id(p["id"]) for p in window],
+        vectors=vectors.tolist(),
+        payloads=[passage_payload(p) for p in window],
+    )
 
 
-def upload_local_embedding(client: QdrantClient, total_passages: int, skip_passages: int):
+def embed_batches(texts: list[str], max_seq_length: int):
+    """Split texts sorted by length into (start, end) embed batches.
+
+    Batches are padded to their longest text, so each one grows while its
+    padded size stays within EMBED_TOKEN_BUDGET: short passages go in large
+    batches, long ones in small batches that cannot run out of memory.
+    """
+    start = 0
+    while start < len(texts):
+        end = start + 1
+        while end < len(texts) and end - start < MAX_EMBED_BATCH_SIZE:
+            tokens = min(len(texts[end]) // CHARS_PER_TOKEN + 2, max_seq_length)
+            if (end - start + 1) * tokens > EMBED_TOKEN_BUDGET:
+                break
+            end += 1
+        yield start, end
+        start = end
+
+
+def open_embed_cache(filepath: str, start_row: int):
+    """Open the embedding cache for appending. Returns (file, cached rows from start_row).
+
+    Starting from the top of INPUT_FILE discards the cache: it may hold
+    embeddings of a different passages file.
+    """
+    row_bytes = VECTOR_DIM * 2
+    if start_row == 0 or not os.path.exists(filepath):
+        return open(filepath, "wb"), np.empty((0, VECTOR_DIM), dtype=np.float16)
+    rows = os.path.getsize(filepath) // row_bytes
+    f = open(filepath, "r+b")
+    f.truncate(rows * row_bytes)  # drop a torn final row
+    f.seek(0, os.SEEK_END)
+    if rows <= start_row:
+        return f, np.empty((0, VECTOR_DIM), dtype=np.float16)
+    cached = np.memmap(filepath, dtype=np.float16, mode="r", shape=(rows, VECTOR_DIM))
+    return f, cached[start_row:]
+
+
+def upload_local_embedding(client_kwargs: dict, start_offset: int, start_row: int):
     """Upload using local sentence-transformers embedding."""
     try:
+        import torch
         from sentence_transformers import SentenceTransformer
+        from sentence_transformers.util import batch_to_device
     except ImportError:
         print("Install sentence-transformers: pip install sentence-transformers")
         sys.exit(1)
 
-    remaining = total_passages - skip_passages
-
-    print(f"Loading embedding model: {MODEL_NAME}...")
-    model = SentenceTransformer(MODEL_NAME)
+    remaining = os.path.getsize(INPUT_FILE) - start_offset
+
+    # Batches run one at a time, so parallelism comes from within each op;
+    # must be set before torch runs any parallel work
+    torch.set_num_interop_threads(1)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    backend = "torch"
+    if device == "cpu":
+        # ONNX Runtime fuses the encoder's matmul/layernorm/GELU kernels and
+        # runs it well ahead of eager PyTorch on CPU; the GPU path stays on
+        # torch FP16
+        try:
+            import optimum.onnxruntime  # noqa: F401
+
+            backend = "onnx"
+        except ImportError:
+            pass
+    print(f"Loading embedding model: {MODEL_NAME} ({device}, {backend})...")
+    model = SentenceTransformer(MODEL_NAME, device=device, backend=backend)
+    model.eval()  # no dropout; encode() did this implicitly, a direct forward does not
+    if device == "cuda":
+        model.half()  # FP16 halves memory traffic and runs on tensor cores
 
     print(f"\nLocal embedding mode")
-    print(f"Embed batch={LOCAL_EMBED_BATCH_SIZE} → Upload batch={LOCAL_UPLOAD_BATCH_SIZE}")
-    print(f"Processing {remaining:,} passages...\n")
-
-    pbar = tqdm(total=remaining, desc="Embed+Upload", unit=" passages", dynamic_ncols=True)
-
-    upload_buffer: list[PointStruct] = []
-    embed_batch: list[dict] = []
-
-    for passage in iter_passages(INPUT_FILE, skip=skip_passages):
-        embed_batch.append(passage)
-
-        if len(embed_batch) >= LOCAL_EMBED_BATCH_SIZE:
-            texts = [p["text"] for p in embed_batch]
-            embeddings = model.encode(texts, show_progress_bar=False)
-
-            for p, emb in zip(embed_batch, embeddings):
-                point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, p["id"]))
-                upload_buffer.append(
-                    PointStruct(
-                        id=point_id,
-                        vector=emb.tolist(),
-                        payload={
-                            "text": p["text"],
-                            "title": p["title"],
-                            "chunk_index": p["chunk_index"],
-                            "passage_id": p["id"],
-                        },
-                    )
-                )
-
-            pbar.update(len(embed_batch))
-            embed_batch = []
-
-            if len(upload_buffer) >= LOCAL_UPLOAD_BATCH_SIZE:
-                client.upsert(collection_name=COLLECTION_NAME, points=upload_buffer, wait=False)
-                upload_buffer = []
-
-    # Handle remaining embed batch
-    if embed_batch:
-        texts = [p["text"] for p in embed_batch]
-        embeddings = model.encode(texts, show_progress_bar=False)
-        for p, emb in zip(embed_batch, embeddings):
-            point_id = str(uuid.uuid5(uuid.NAMESPACE_URL, p["id"]))
-            upload_buffer.append(
-                PointStruct(
-                    id=point_id,
-                    vector=emb.tolist(),
-                    payload={
-                        "text": p["text"],
-                        "title": p["title"],
-                        "chunk_index": p["chunk_index"],
-                        "passage_id": p["id"],
-                    },
-                )
-            )
-        pbar.update(len(embed_batch))
-
-    if upload_buffer:
-        client.upsert(collection_name=COLLECTION_NAME, points=upload_buffer, wait=True)
-
+    print(f"Embed tokens/batch={EMBED_TOKEN_BUDGET} → Upload batch={LOCAL_UPLOAD_BATCH_SIZE}")
+    print(f"Processing {remaining:,} bytes of passages...\n")
+
+    # Embeddings for one upload window are written into a single reusable matrix
+    # on the model's device, copied to the host and converted to lists once per
+    # upload rather than once per embed batch or vector
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    vecs = torch.empty((LOCAL_UPLOAD_BATCH_SIZE, VECTOR_DIM), device=device, dtype=dtype)
+
+    def embed_window(window: list[dict]) -> np.ndarray:
+        """Embed a window; rows come back in the window's order."""
+        # Similar lengths per embed batch means less padding per forward pass
+        order = sorted(range(len(window)), key=lambda k: len(window[k]["text"]))
+        texts = [window[k]["text"] for k in order]
+        with torch.inference_mode():
+            for i, j in embed_batches(texts, model.max_seq_length):
+                # tokenize() runs the Rust fast tokenizer over the whole batch,
+                # padded to its longest text and truncated at max_seq_length;
+                # a direct forward pass skips encode()'s per-call re-sorting,
+                # batching and conversion. batch_to_device moves only the
+                # tensors: newer releases add non-tensor keys like "modality"
+                features = batch_to_device(model.tokenize(texts[i:j]), device)
+                embeddings = model(features)["sentence_embedding"]
+                vecs[i:j] = torch.nn.functional.normalize(embeddings, dim=1)
+
+        # Own copy on the host, unsorted back to window order: vecs is
+        # overwritten by the next window while this one is still uploading
+        rows = np.empty((len(window), VECTOR_DIM), dtype=np.float32)
+        rows[order] = vecs[: len(window)].to("cpu", torch.float32).numpy()
+        return rows
+
+    asyncio.run(_upload_local_embedding(client_kwargs, start_offset, start_row, embed_window))
+
+
+async def _upload_local_embedding(
+    client_kwargs: dict, start_offset: int, start_row: int, embed_window
+):
+    remaining = os.path.getsize(INPUT_FILE) - start_offset
+    pbar = tqdm(total=remaining, desc="Embed+Upload", unit="B", unit_scale=True, dynamic_ncols=True)
+    # The model embeds on a worker thread while upserts, and the ID hashing
+    # and list conversion that build them, run on the event loop
+    loop = asyncio.get_running_loop()
+    client = AsyncQdrantClient(**client_kwargs)
+    slots = asyncio.Semaphore(MAX_PENDING_UPLOADS)
+    pending: deque[tuple[asyncio.Task, int, int]] = deque()
+
+    async def upsert(window: list[dict], vectors, nbytes: int):
+        try:
+            batch = window_batch(window, vectors)
+            await client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=False)
+        finally:
+            slots.release()
+        pbar.update(nbytes)
+
+    cache_file, cached = open_embed_cache(EMBED_CACHE_FILE, start_row)
+    if len(cached):
+        print(f"Reusing {len(cached):,} cached embeddings")
+
+    passages = iter_passages(INPUT_FILE, start_offset)
+    window_start = start_offset
+    row = 0  # from start_row
+    while window := list(itertools.islice(passages, LOCAL_UPLOAD_BATCH_SIZE)):
+        window_end = window[-1][0]
+        window = [p for _, p in window]
+        if row + len(window) <= len(cached):
+            vectors = cached[row : row + len(window)].astype(np.float32)
+        else:
+            vectors = await loop.run_in_executor(None, embed_window, window)
+            # Overlapping rows (a window size change) are simply rewritten
+            cache_file.seek((start_row + row) * VECTOR_DIM * 2)
+            cache_file.write(vectors.astype(np.float16).tobytes())
+        row += len(window)
+
+        if len(window) < LOCAL_UPLOAD_BATCH_SIZE:
+            # Short window means end of input: surface any upload error, then
+            # send the final batch blocking
+            await asyncio.gather(*(task for task, _, _ in pending))
+            pending.clear()
+            batch = window_batch(window, vectors)
+            await client.upsert(collection_name=COLLECTION_NAME, points=batch, wait=True)
+            pbar.update(window_end - window_start)
+        else:
+            await slots.acquire()  # embedding waits while all slots are busy
+            record_progress(pending, PROGRESS_FILE)
+            task = asyncio.create_task(upsert(window, vectors, window_end - window_start))
+            pending.append((task, window_end, start_row + row))
+        window_start = window_end
+
+    await asyncio.gather(*(task for task, _, _ in pending))
+    save_progress(PROGRESS_FILE, window_start, start_row + row)
+
+    # Everything is in Qdrant; the cache only served a resume
+    cache_file.close()
+    os.remove(EMBED_CACHE_FILE)
+
+    await client.close()
     pbar.close()
 
 
@@ -250,12 +466,14 @@ def main():
         print("Run chunk_wiki.py first.")
         sys.exit(1)
 
-    print(f"Counting passages in {INPUT_FILE}...")
-    total_passages = count_lines(INPUT_FILE)
-    print(f"Total: {total_passages:,} passages")
-
     print(f"Connecting to Qdrant: {QDRANT_URL}...")
-    client_kwargs = {"url": QDRANT_URL, "api_key": QDRANT_API_KEY, "timeout": 120}
+    # gRPC ships vectors as protobuf instead of JSON-encoded float arrays
+    client_kwargs = {
+        "url": QDRANT_URL,
+        "api_key": QDRANT_API_KEY,
+        "timeout": 120,
+        "prefer_grpc": True,
+    }
     if cloud_inference:
         client_kwargs["cloud_inference"] = True
     client = QdrantClient(**client_kwargs)
@@ -267,19 +485,18 @@ def main():
             client.delete_collection(COLLECTION_NAME)
             print(f"Deleted existing collection '{COLLECTION_NAME}'")
 
-    existing_points = ensure_collection(client, cloud_inference)
+    created = ensure_collection(client, cloud_inference)
 
-    # Resume: skip passages already uploaded
-    skip_passages = 0
-    batch_size = UPLOAD_BATCH_SIZE if cloud_inference else LOCAL_UPLOAD_BATCH_SIZE
-    if existing_points > 0:
-        skip_passages = (existing_points // batch_size) * batch_size
-        print(f"Resuming: skipping first {skip_passages:,} passages (already uploaded)")
+    # Resume from the journal: every passage before its offset is in Qdrant.
+    # A collection created just now is empty, whatever an old journal says.
+    start_offset, start_row = (0, 0) if created else load_progress(PROGRESS_FILE)
+    if start_offset > 0:
+        print(f"Resuming: skipping first {start_row:,} passages (already uploaded)")
 
     if cloud_inference:
-        upload_cloud_inference(client, total_passages, skip_passages)
+        upload_cloud_inference(client_kwargs, start_offset, start_row)
     else:
-        upload_local_embedding(client, total_passages, skip_passages)
+        upload_local_embedding(client_kwargs, start_offset, start_row)
 
     # Re-enable indexing
     print("\nUpload complete. Enabling indexing (threshold=20000)...")
@@ -288,8 +505,8 @@ def main():
         optimizer_config=OptimizersConfigDiff(indexing_threshold=20000),
     )
 
-    info = client.get_collection(COLLECTION_NAME)
-    print(f"Done. {info.points_count:,} points in '{COLLECTION_NAME}'. Indexing will run in background.")
+    _, uploaded = load_progress(PROGRESS_FILE)
+    print(f"Done. {uploaded:,} passages in '{COLLECTION_NAME}'. Indexing will run in background.")
 
 
 if __name__ == "__main__":